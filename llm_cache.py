@@ -0,0 +1,11 @@
+import hashlib
+from diskcache import Cache
+
+CACHE_DIR = "/tmp/llm_cache"
+CACHE_TTL = 86400  # 1 day
+
+cache = Cache(CACHE_DIR)
+
+
+def make_image_key(model, prompt, size):
+    return hashlib.sha256(f"{model}|{size}|{prompt}".encode()).hexdigest()
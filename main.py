@@ -1,16 +1,31 @@
 import os
+import re
+import base64
 import yaml
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader as YamlLoader
 import json
+import orjson
 import logging
 import time
-from fastapi import FastAPI, HTTPException
+import asyncio
+import functools
+import threading
+from fastapi import FastAPI, BackgroundTasks
 from datetime import datetime
-from openai import OpenAI
-from github import Github
+from openai import AsyncOpenAI, NOT_GIVEN
+from github import Github, GithubException
 import random
 from dotenv import load_dotenv
 from vercel_blob import put
 import requests
+import httpx
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from llm_cache import cache, make_image_key, CACHE_TTL
+from rate_limit import RateLimiter, openai_retry
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -23,98 +38,264 @@ for var in ["OPENAI_API_KEY", "GIT_TOKEN","BLOB_READ_WRITE_TOKEN"]:
         raise ValueError(f"{var} not set")
 
 app = FastAPI(title="Crew AI Bot API", description="API to run Crew AI Bot", version="1.0.0")
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+# Shared session so image downloads reuse pooled keep-alive connections
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+COVER_IMAGE_PLACEHOLDER = "{{COVER_IMAGE}}"
+
+CATEGORIES = (
+    "AI", "Web3", "Blockchain Fusion", "Startups", "Tech Culture",
+    "Tools & Reviews", "How-Tos", "Editorials", "AGI"
+)
+
+_SLUG_RE = re.compile(r"[^a-z0-9]+")
+
+_COVER_IMAGE_LINE_RE = re.compile(r"^([ \t]*)coverImage:.*$", re.M)
+
+# Matches the leading "title" and "image_prompt" string values of a partially streamed JSON object
+_EARLY_IMAGE_PROMPT_RE = re.compile(
+    r'"title"\s*:\s*("(?:[^"\\]|\\.)*")\s*,\s*"image_prompt"\s*:\s*("(?:[^"\\]|\\.)*")'
+)
+
+TITLE_AND_RESEARCH_PROMPT = """
+    Plan a blog post for the category '{category}' in {current_year}.
+    Return a JSON object with these keys, in this order:
+    - "title": a catchy blog post title focused on recent trends or innovations (e.g., AI breakthroughs, Web3 scalability, AGI ethics), max 10 words.
+    - "image_prompt": a prompt for a visually striking, modern, relevant cover image for the post
+      (e.g., futuristic AI for AI category, blockchain nodes for Web3), max 20 words.
+    - "research": an array of 8 short bullet points summarizing key developments for the title, one each for:
+      recent innovations, current trends, key statistics, future predictions, practical applications,
+      notable challenge, industry impact, emerging opportunity. Max 30 words per bullet.
+    """.format
+
+BLOG_POST_PROMPT = """
+    Write a short blog post about {topic} in Markdown, using this research:
+    {research_output}
+    Start with this frontmatter (single quotes):
+    
+    ---
+    title: '(Catchy title)'
+    status: 'published'
+    author:
+      name: '{author_name}'
+      picture: '{author_picture_url}'
+    slug: '(URL-friendly title)'
+    description: '(One-sentence summary)'
+    coverImage: '{cover_image_url}'
+    category: '{topic}'
+    publishedAt: '{current_date_iso}'
+    ---
+    
+    Content: 2-3 paragraphs, max 200 words total, no code blocks.
+    """.format
+
+# The agent only runs from the cron trigger, so it can trade latency for price.
+# Flex processing is only offered on some models (o3/o4-mini class, not gpt-4o-mini),
+# so set both together, e.g. CHAT_MODEL=o4-mini OPENAI_SERVICE_TIER=flex.
+CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-4o-mini")
+# Reasoning models reject temperature and spend hidden reasoning tokens out of the
+# completion budget, so they get a low effort and extra room on top of max_tokens
+REASONING_MODEL = CHAT_MODEL.startswith(("o1", "o3", "o4", "gpt-5"))
+REASONING_TOKEN_BUDGET = 2048
+SERVICE_TIER = os.getenv("OPENAI_SERVICE_TIER") or NOT_GIVEN
+
+IMAGE_MODEL = os.getenv("IMAGE_MODEL", "dall-e-2")
+IMAGE_SIZE = os.getenv("IMAGE_SIZE", "512x512")
+
+METADATA_PATH = "outstatic/content/metadata.json"
+
+# Last known metadata.json blob sha and raw content, reused until GitHub rejects the sha as stale
+metadata_cache = {}
+# Pushes run in worker threads and runs can overlap; serialise the metadata read-modify-write
+metadata_lock = threading.Lock()
+
+openai_limiter = RateLimiter(
+    requests_per_minute=int(os.getenv("OPENAI_RPM", "500")),
+    tokens_per_minute=int(os.getenv("OPENAI_TPM", "200000"))
+)
+
+
+# Clients are built on first use so cold starts and health checks don't pay for them
+@functools.lru_cache(maxsize=1)
+def get_openai():
+    return AsyncOpenAI(
+        api_key=os.environ["OPENAI_API_KEY"],
+        max_retries=0,  # Retries are handled by openai_retry
+        http_client=httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=20, keepalive_expiry=60)
+        )
+    )
 
-def research_topic(topic, current_year):
-    if not topic or not topic.strip():
-        raise ValueError("Topic cannot be empty")
-    if not current_year.isdigit():
-        raise ValueError("Current year must be a number")
 
-    prompt = f"""
-    Summarize key developments in {topic} for {current_year} in 8 short bullet points:
-    - Recent innovations (1 sentence).
-    - Current trends (1 sentence).
-    - Key statistics (1 sentence).
-    - Future predictions (1 sentence).
-    - Practical applications (1 sentence).
-    - Notable challenge (1 sentence).
-    - Industry impact (1 sentence).
-    - Emerging opportunity (1 sentence).
-    Keep it concise, max 30 words per bullet.
-    """
-    start_time = time.time()
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=300,
-            temperature=0.7
-        )
-        content = response.choices[0].message.content.strip()
-        if not content:
-            raise ValueError("Empty OpenAI response")
-        logger.info(f"Research took {time.time() - start_time:.2f} seconds")
-        return content
-    except Exception as e:
-        logger.error(f"OpenAI error: {str(e)}")
-        raise RuntimeError(f"Research failed: {str(e)}")
+@functools.lru_cache(maxsize=1)
+def get_repo():
+    github_client = Github(os.environ["GIT_TOKEN"], per_page=100, retry=Retry(total=3, backoff_factor=0.5))
+    # lazy=True skips the GET /repos round-trip; the handle is only used for writes/reads by path
+    return github_client.get_repo("abdullahhsajid/repo-name", lazy=True)
+
+
+def slugify(text):
+    return _SLUG_RE.sub("-", text.lower()).strip("-")
+
 
+@openai_retry
+@openai_limiter
+async def create_chat_completion(**kwargs):
+    return await get_openai().chat.completions.create(**kwargs)
 
-def generate_image_prompt(topic,title,research_output):
-    prompt = f"""
-    Create a prompt for an image based on the blog post titled '{title}' in the category '{topic}'.
-    Use this research: {research_output}
-    The image should be visually striking, modern, and relevant (e.g., futuristic AI for AI category, blockchain nodes for Web3).
-    Keep the prompt concise, max 20 words.
+
+@openai_retry
+@openai_limiter
+async def create_image(**kwargs):
+    return await get_openai().images.generate(**kwargs)
+
+
+async def _chat(prompt, *, max_tokens, label, on_content=None, **options):
+    """Run a chat completion for a single user prompt and return its content.
+
+    With on_content the response is streamed and on_content(content_so_far) is
+    called per chunk.
+    """
+    kwargs = dict(
+        model=CHAT_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        max_completion_tokens=max_tokens,
+        service_tier=SERVICE_TIER,
+        **options
+    )
+    if REASONING_MODEL:
+        kwargs["max_completion_tokens"] += REASONING_TOKEN_BUDGET
+        kwargs["reasoning_effort"] = "low"
+    else:
+        kwargs["temperature"] = 0.7
+    start_time = time.perf_counter()
+    if on_content is None:
+        response = await create_chat_completion(**kwargs)
+        content = response.choices[0].message.content
+    else:
+        content = ""
+        stream = await create_chat_completion(stream=True, **kwargs)
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            if chunk.choices[0].finish_reason == "length":
+                raise ValueError(f"{label} response truncated at max_tokens={max_tokens}")
+            if not chunk.choices[0].delta.content:
+                continue
+            content += chunk.choices[0].delta.content
+            on_content(content)
+    if not content or content.isspace():
+        raise ValueError(f"Empty {label} response")
+    logger.info(f"{label} took {time.perf_counter() - start_time:.2f} seconds")
+    return content
+
+
+async def generate_title_and_research(category, current_year, on_image_prompt=None):
+    """Plan a post in one streamed request.
+
+    If given, on_image_prompt(title, image_prompt) is called as soon as both values
+    have streamed in, while the research bullets are still being generated.
     """
-    start_time = time.time()
+    if not category or not category.strip():
+        raise ValueError("Category cannot be empty")
+    if not current_year.isdigit():
+        raise ValueError("Current year must be a number")
+
+    start_time = time.perf_counter()
+
+    def check_image_prompt(content):
+        nonlocal on_image_prompt
+        if not on_image_prompt:
+            return
+        match = _EARLY_IMAGE_PROMPT_RE.search(content)
+        if match:
+            early_title, early_image_prompt = (json.loads(group) for group in match.groups())
+            if early_title.strip() and early_image_prompt.strip():
+                logger.info(f"Image prompt ready after {time.perf_counter() - start_time:.2f} seconds")
+                on_image_prompt(early_title.strip().strip('"'), early_image_prompt.strip())
+                on_image_prompt = None
+
+    # No embedding-based research cache here: the topic is generated in this same
+    # request, so there is nothing to look up before the call, and reusing a
+    # near-duplicate topic's output would also repeat its title and slug.
+    prompt = TITLE_AND_RESEARCH_PROMPT(category=category, current_year=current_year)
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=50,
-            temperature=0.7
+        content = await _chat(
+            prompt,
+            max_tokens=600,  # ~310 tokens of bullets plus title, image prompt and JSON syntax
+            label="Title and research",
+            on_content=check_image_prompt,
+            response_format={"type": "json_object"}
         )
-        content = response.choices[0].message.content.strip()
-        if not content:
-            raise ValueError("Empty image prompt response")
-        logger.info(f"Image prompt generation took {time.time() - start_time:.2f} seconds")
-        return content
+        data = json.loads(content)
+
+        title = str(data.get("title", "")).strip().strip('"')
+        research = data.get("research", [])
+        if isinstance(research, list):
+            research = "\n".join(f"- {str(bullet).strip()}" for bullet in research)
+        research = str(research).strip()
+        image_prompt = str(data.get("image_prompt", "")).strip()
+        if not title or not research or not image_prompt:
+            raise ValueError(f"Incomplete OpenAI response: {content}")
+        return title, research, image_prompt
     except Exception as e:
-        logger.error(f"Image prompt generation error: {str(e)}")
-        raise RuntimeError(f"Image prompt generation failed: {str(e)}")
+        logger.error(f"OpenAI error: {str(e)}")
+        raise RuntimeError(f"Title and research failed: {str(e)}")
 
 
-def generate_and_upload_image(image_prompt, title):
-    start_time = time.time()
+async def generate_and_upload_image(image_prompt, title):
+    start_time = time.perf_counter()
     try:
-        logger.info(f"Generating image with prompt: {image_prompt}")
-        # Generate image with DALL·E 3
-        response = client.images.generate(
-            model="dall-e-3",
+        cache_key = make_image_key(IMAGE_MODEL, image_prompt, IMAGE_SIZE)
+        cached_url = cache.get(cache_key)
+        if cached_url:
+            logger.info(f"Using cached image URL: {cached_url}")
+            return cached_url
+
+        logger.info(f"Generating image with {IMAGE_MODEL} ({IMAGE_SIZE}), prompt: {image_prompt}")
+        image_options = {}
+        if IMAGE_MODEL.startswith("dall-e"):
+            # Return the bytes inline instead of a URL to download (gpt-image-* always does)
+            image_options["response_format"] = "b64_json"
+        if IMAGE_MODEL == "dall-e-3":
+            image_options["quality"] = "standard"
+        response = await create_image(
+            model=IMAGE_MODEL,
             prompt=image_prompt,
-            size="1024x1024",  # Use supported size; resize later if needed
-            quality="standard",
-            n=1
+            size=IMAGE_SIZE,
+            n=1,
+            **image_options
         )
-        image_url = response.data[0].url
-        logger.info(f"Generated image URL: {image_url}")
-
-        # Download image
-        image_response = requests.get(image_url, timeout=10)
-        image_response.raise_for_status()
-        image_data = image_response.content
+        image = response.data[0]
+        if image.b64_json:
+            image_data = base64.b64decode(image.b64_json)
+        else:
+            # Download image
+            logger.info(f"Generated image URL: {image.url}")
+            image_response = await asyncio.to_thread(SESSION.get, image.url, timeout=10)
+            image_response.raise_for_status()
+            image_data = image_response.content
 
         # Upload to Vercel Blob
-        blob_filename = f"images/{title.lower().replace(' ', '-')}-{int(time.time())}.png"
-        blob_response = put(blob_filename, image_data, {"access": "public", "contentType": "image/png"})
+        blob_filename = f"images/{slugify(title)}-{int(time.time())}.png"
+        blob_response = await asyncio.to_thread(
+            put, blob_filename, image_data, {"access": "public", "contentType": "image/png"}
+        )
         blob_url = blob_response['url']  # Extract only the URL
         logger.info(f"Uploaded image response: {blob_response}")
         logger.info(f"Using image URL: {blob_url}")
+        cache.set(cache_key, blob_url, expire=CACHE_TTL)
 
-        logger.info(f"Image generation and upload took {time.time() - start_time:.2f} seconds")
+        logger.info(f"Image generation and upload took {time.perf_counter() - start_time:.2f} seconds")
         return blob_url
     except Exception as e:
         logger.error(f"Image generation/upload error: {str(e)}")
@@ -124,73 +305,86 @@ def generate_and_upload_image(image_prompt, title):
         return placeholder_url
 
 
-def write_blog_post(topic, research_output, author_name, author_picture_url, cover_image_url, current_date_iso):
-    prompt = f"""
-    Write a short blog post about {topic} in Markdown, using this research:
-    {research_output}
-    Start with this frontmatter (single quotes):
-    
-    ---
-    title: '(Catchy title)'
-    status: 'published'
-    author:
-      name: '{author_name}'
-      picture: '{author_picture_url}'
-    slug: '(URL-friendly title)'
-    description: '(One-sentence summary)'
-    coverImage: '{cover_image_url}'
-    category: '{topic}'
-    publishedAt: '{current_date_iso}'
-    ---
-    
-    Content: 2-3 paragraphs, max 200 words total, no code blocks.
-    """
-    start_time = time.time()
+async def write_blog_post(topic, research_output, author_name, author_picture_url, cover_image_url, current_date_iso):
+    prompt = BLOG_POST_PROMPT(
+        topic=topic,
+        research_output=research_output,
+        author_name=author_name,
+        author_picture_url=author_picture_url,
+        cover_image_url=cover_image_url,
+        current_date_iso=current_date_iso
+    )
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=600,
-            temperature=0.7
-        )
-        content = response.choices[0].message.content.strip()
-        if not content:
-            raise ValueError("Empty OpenAI response")
-        logger.info(f"Blog post took {time.time() - start_time:.2f} seconds")
-        return content
+        # Chat responses are deliberately not cached: this prompt carries a timestamp so
+        # it never repeats, and a hit would reuse the previous post's slug. The planning
+        # request is streamed and must produce a fresh title each run.
+        # Leading/trailing whitespace is stripped by git_push_callback
+        return await _chat(prompt, max_tokens=600, label="Blog post")
     except Exception as e:
         logger.error(f"OpenAI error: {str(e)}")
         raise RuntimeError(f"Blog post failed: {str(e)}")
 
 
-def git_push_callback(task_output):
-    start_time = time.time()
-    pat = os.getenv("GIT_TOKEN")
-    if not pat:
-        logger.error("GIT_TOKEN not set")
-        raise ValueError("GIT_TOKEN not set")
+def load_metadata(refresh=False):
+    if refresh or not metadata_cache:
+        metadata_cache.clear()
+        try:
+            metadata_file = get_repo().get_contents(METADATA_PATH)
+            metadata_cache["sha"] = metadata_file.sha
+            metadata_cache["content"] = metadata_file.decoded_content
+        except GithubException as e:
+            if e.status != 404:
+                raise
+            logger.info("metadata.json not found")
+            metadata_cache["sha"] = None
+            metadata_cache["content"] = None
 
-    g = Github(pat)
-    repo = g.get_repo("abdullahhsajid/repo-name")
-    
-    report_file = "/tmp/report.md"
-    if not os.path.exists(report_file):
-        logger.error(f"Report file missing: {report_file}")
-        raise FileNotFoundError(f"Report file missing")
-
-    with open(report_file, 'r') as f:
-        content = f.read().strip()
+    metadata_json = {"metadata": []}
+    if metadata_cache["content"]:
+        metadata_json = orjson.loads(metadata_cache["content"])
+    return metadata_cache["sha"], metadata_json
+
+
+def save_metadata(new_entry):
+    with metadata_lock:
+        for attempt in range(2):
+            sha, metadata_json = load_metadata(refresh=attempt > 0)
+            metadata_json['metadata'].append(new_entry)
+            payload = orjson.dumps(metadata_json, option=orjson.OPT_INDENT_2)
+            try:
+                if sha:
+                    result = get_repo().update_file(METADATA_PATH, "Update metadata", payload, sha)
+                else:
+                    result = get_repo().create_file(METADATA_PATH, "Create metadata", payload)
+            except GithubException as e:
+                # 409/422 means the sha is stale: metadata.json changed upstream, possibly
+                # from another instance, even if it was only just fetched
+                if attempt == 0 and e.status in (409, 422):
+                    logger.info("metadata.json changed upstream, refetching")
+                    continue
+                raise
+            metadata_cache["sha"] = result["content"].sha
+            metadata_cache["content"] = payload
+            return
+
+
+def git_push_callback(content):
+    start_time = time.perf_counter()
+    content = content.strip()
 
     metadata = {}
     if content.startswith('---'):
         frontmatter_end = content.index('---', 3)
         frontmatter = content[3:frontmatter_end].strip()
-        metadata = yaml.safe_load(frontmatter) or {}
+        metadata = yaml.load(frontmatter, Loader=YamlLoader) or {}
     slug = metadata.get('slug', 'default-slug')
     new_filename = f"{slug}.md"
 
+    # The Contents API is used on purpose: a single Git Data API commit (ref, commit,
+    # tree, commit, ref update) costs 4-5 requests, while create_file + update_file
+    # with the cached metadata sha costs 2.
     try:
-        repo.create_file(
+        get_repo().create_file(
             f"outstatic/content/blogs/{new_filename}",
             f"Add {new_filename}",
             content
@@ -199,13 +393,6 @@ def git_push_callback(task_output):
         logger.error(f"Push failed: {str(e)}")
         raise RuntimeError(f"Push failed: {str(e)}")
 
-    metadata_json = {"metadata": []}
-    try:
-        metadata_file = repo.get_contents("outstatic/content/metadata.json")
-        metadata_json = json.loads(metadata_file.decoded_content.decode())
-    except:
-        logger.info("metadata.json not found")
-
     new_entry = {
         "category": metadata.get('category', 'Uncategorized'),
         "collection": "blogs",
@@ -224,80 +411,51 @@ def git_push_callback(task_output):
             "path": f"outstatic/content/blogs/{slug}.md"
         }
     }
-    metadata_json['metadata'].append(new_entry)
 
     try:
-        if 'metadata_file' in locals():
-            repo.update_file(
-                "outstatic/content/metadata.json",
-                "Update metadata",
-                json.dumps(metadata_json, indent=2),
-                metadata_file.sha
-            )
-        else:
-            repo.create_file(
-                "outstatic/content/metadata.json",
-                "Create metadata",
-                json.dumps(metadata_json, indent=2)
-            )
+        save_metadata(new_entry)
     except Exception as e:
         logger.error(f"Metadata update failed: {str(e)}")
         raise RuntimeError(f"Metadata update failed: {str(e)}")
 
-    logger.info(f"Git push took {time.time() - start_time:.2f} seconds")
+    logger.info(f"Git push took {time.perf_counter() - start_time:.2f} seconds")
     return "Successfully pushed blog post"
 
 
-def select_category_and_title():
-    categories = [
-        "AI", "Web3", "Blockchain Fusion", "Startups", "Tech Culture",
-        "Tools & Reviews", "How-Tos", "Editorials", "AGI"
-    ]
-    selected_category = random.choice(categories)
-    
-    prompt = f"""
-    Generate a catchy blog post title for the category '{selected_category}'.
-    Focus on recent trends or innovations (e.g., AI breakthroughs, Web3 scalability, AGI ethics).
-    Keep it concise, max 10 words.
-    """
-    start_time = time.time()
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=50,
-            temperature=0.7
-        )
-        title = response.choices[0].message.content.strip()
-        if not title:
-            raise ValueError("Empty title response")
-        logger.info(f"Title generation took {time.time() - start_time:.2f} seconds")
-        return selected_category, title
-    except Exception as e:
-        logger.error(f"Title generation error: {str(e)}")
-        raise RuntimeError(f"Title generation failed: {str(e)}")
-
-
 @app.get("/")
 async def root():
     return {"message": "Blog Agent API is running"}
 
 
 @app.get("/run-agent")
-async def trigger_event():
-    run_agent()
+async def trigger_event(background_tasks: BackgroundTasks):
+    background_tasks.add_task(run_agent)
     return {"message": "Agent is running in the background"}
 
 @app.get("/api/cron")
 async def run_cron():
     return {"message": "Cron job executed successfully"}  
 
-def run_agent():
-    start_time = time.time()
+async def run_agent():
+    start_time = time.perf_counter()
+    image_task = None
+
+    def start_image(title, image_prompt):
+        nonlocal image_task
+        image_task = asyncio.create_task(generate_and_upload_image(image_prompt, title))
+
     try:
-        selected_category, title = select_category_and_title()
+        selected_category = random.choice(CATEGORIES)
+        current_year = str(datetime.now().year)
+        title, research_output, image_prompt = await generate_title_and_research(
+            selected_category, current_year, on_image_prompt=start_image
+        )
+        if image_task is None:
+            start_image(title, image_prompt)
         topic = title
         logger.info(f"Selected category: {selected_category}, Title: {title}")
+        logger.info(f"Research output length: {len(research_output)} chars")
+        logger.info(f"Image prompt: {image_prompt}")
 
         # required_fields = ['topic', 'author_name', 'author_picture_url']
         # for field in required_fields:
@@ -305,36 +463,43 @@ def run_agent():
         #         raise ValueError(f"Missing field: {field}")
 
         current_datetime_iso = datetime.now().isoformat() + "Z"
-        topic = topic.strip()
-        current_year = str(datetime.now().year)
         author_name = "Abdullah Sajid"
         author_picture_url = "https://avatars.githubusercontent.com/u/176460407?v=4"
-        cover_image_url = "https://avatars.githubusercontent.com/u/176460407?v=4"
 
-        research_output = research_topic(topic, current_year)
-        logger.info(f"Research output length: {len(research_output)} chars")
-
-        image_prompt = generate_image_prompt(topic, title, research_output)
-        logger.info(f"Image prompt: {image_prompt}")
-        cover_image_url = generate_and_upload_image(image_prompt, title)
-
-        blog_content = write_blog_post(
-            topic, research_output, author_name, author_picture_url, cover_image_url, current_datetime_iso
+        # The blog text doesn't depend on the uploaded image, so write it with a
+        # placeholder cover and substitute the blob URL once both are done.
+        cover_image_url, blog_content = await asyncio.gather(
+            image_task,
+            write_blog_post(
+                topic, research_output, author_name, author_picture_url, COVER_IMAGE_PLACEHOLDER, current_datetime_iso
+            ),
         )
+        if COVER_IMAGE_PLACEHOLDER in blog_content:
+            blog_content = blog_content.replace(COVER_IMAGE_PLACEHOLDER, cover_image_url)
+        else:
+            # The model didn't copy the placeholder back verbatim; set the frontmatter line ourselves
+            logger.warning("Cover image placeholder missing from blog post, rewriting coverImage")
+            blog_content, count = _COVER_IMAGE_LINE_RE.subn(
+                lambda m: f"{m.group(1)}coverImage: '{cover_image_url}'", blog_content, count=1
+            )
+            if not count:
+                raise ValueError("Blog post frontmatter has no coverImage line")
         logger.info(f"Blog content length: {len(blog_content)} chars")
-        
-        report_file = "/tmp/report.md"
-        with open(report_file, 'w') as f:
-            f.write(blog_content)
-        logger.info(f"File write took {time.time() - start_time:.2f} seconds so far")
-
-        result = git_push_callback(None)
-        total_time = time.time() - start_time
+
+        if os.getenv("DEBUG_DUMP"):
+            with open("/tmp/report.md", 'w') as f:
+                f.write(blog_content)
+
+        result = await asyncio.to_thread(git_push_callback, blog_content)
+        total_time = time.perf_counter() - start_time
         logger.info(f"Total execution took {total_time:.2f} seconds")
         return {"result": result, "execution_time": total_time}
     except Exception as e:
-        logger.error(f"API error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        if image_task is not None:
+            image_task.cancel()
+        # Runs as a background task after the response is sent, so there is no client to report to
+        logger.exception(f"Agent run failed: {str(e)}")
+        return None
 
 
 if __name__ == "__main__":
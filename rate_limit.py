@@ -0,0 +1,90 @@
+import time
+import asyncio
+import logging
+import functools
+from collections import deque
+from openai import RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+_backoff = wait_random_exponential(min=1, max=30)
+
+
+def wait_retry_after(retry_state):
+    """Honour the server's retry-after header when present, else back off exponentially."""
+    exc = retry_state.outcome.exception()
+    response = getattr(exc, "response", None)
+    if response is not None:
+        try:
+            return min(float(response.headers.get("retry-after")), 30)
+        except (TypeError, ValueError):
+            pass
+    return _backoff(retry_state)
+
+
+def estimate_tokens(kwargs):
+    """Rough upper bound for a request: prompt chars / 4 plus the completion cap."""
+    prompt_tokens = len(str(kwargs.get("messages") or kwargs.get("prompt") or "")) // 4
+    completion_tokens = kwargs.get("max_completion_tokens") or kwargs.get("max_tokens") or 0
+    return prompt_tokens + completion_tokens
+
+
+class RateLimiter:
+    """Caps concurrent requests, plus requests and tokens per minute, with a sliding window.
+
+    Each call reserves estimate_tokens() up front; the reservation is replaced by
+    usage.total_tokens once the response reports it (streamed responses keep the estimate).
+    """
+
+    def __init__(self, max_concurrent=250, requests_per_minute=500, tokens_per_minute=200000):
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window = deque()  # [timestamp, tokens] per request
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, tokens):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                while self.window and now - self.window[0][0] >= 60:
+                    self.window.popleft()
+                used_tokens = sum(entry[1] for entry in self.window)
+                # An empty window always admits, so one oversized request can't block forever
+                if not self.window or (
+                    len(self.window) < self.requests_per_minute
+                    and used_tokens + tokens <= self.tokens_per_minute
+                ):
+                    entry = [now, tokens]
+                    self.window.append(entry)
+                    return entry
+                delay = 60 - (now - self.window[0][0])
+                logger.info(f"Rate limit reached, waiting {delay:.2f} seconds")
+                await asyncio.sleep(delay)
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            async with self.semaphore:
+                entry = await self.acquire(estimate_tokens(kwargs))
+                result = await func(*args, **kwargs)
+                usage = getattr(result, "usage", None)
+                if usage is not None and getattr(usage, "total_tokens", None) is not None:
+                    entry[1] = usage.total_tokens
+                return result
+        return wrapper
+
+
+def openai_retry(func):
+    return retry(
+        retry=retry_if_exception_type(RETRYABLE_ERRORS),
+        wait=wait_retry_after,
+        stop=stop_after_attempt(5),
+        reraise=True,
+        before_sleep=lambda state: logger.warning(
+            f"OpenAI call failed ({state.outcome.exception()}), retry {state.attempt_number}"
+        )
+    )(func)